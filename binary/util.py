@@ -29,7 +29,7 @@ id_fmt = '0x%02x%02x%02x'
 def read_definition(definition, protocol_defs_path):
     file_path = join(protocol_defs_path, definition + '.yaml')
     with open(file_path, 'r') as file:
-        return yaml.load(file, Loader=yaml.Loader)
+        return yaml.load(file, Loader=YamlLoader)
 
 
 def get_custom_type_definitions(protocol_defs_path):
@@ -37,6 +37,7 @@ def get_custom_type_definitions(protocol_defs_path):
     if not exists(custom_codec_defs_path):
         return {}
     definitions = read_definition('Custom', custom_codec_defs_path)
+    preprocess_definitions([definitions])
     result = {}
     custom_types = definitions['customTypes']
     for definition in custom_types:
@@ -29,6 +29,14 @@ def save_binary_files(binary_output_dir, protocol_defs_path, version, services):
             )
 
 
+def save_compatibility_files(test_output_dir, binary_output_dir, protocol_defs_path, lang, version, services):
+    # Templates cannot be pickled, so they are loaded
+    # in the worker process that generates the files.
+    templates = get_binary_templates(lang)
+    save_test_files(test_output_dir, lang, version, services, templates)
+    save_binary_files(binary_output_dir, protocol_defs_path, version, services)
+
+
 def save_test_files(test_output_dir, lang, version, services, templates):
     makedirs(test_output_dir, exist_ok=True)
     class_name = binary_test_names[lang](version)
@@ -54,7 +62,7 @@ def _generate_binary_files(binary_file, null_binary_file, protocol_defs_path, se
     for service in services:
         methods = service["methods"]
         for method in methods:
-            if get_version_as_number(method["since"]) > version_as_number:
+            if method["_since_num"] > version_as_number:
                 continue
 
             method["request"]["id"] = int(id_fmt % (service["id"], method["id"], 0), 16)
@@ -84,7 +92,7 @@ def _generate_binary_files(binary_file, null_binary_file, protocol_defs_path, se
             null_response.write(null_binary_file)
             if events is not None:
                 for e in events:
-                    if get_version_as_number(e["since"]) > version_as_number:
+                    if e["_since_num"] > version_as_number:
                         continue
 
                     event = encoder.encode(
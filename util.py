@@ -3,6 +3,8 @@ import hashlib
 import json
 import re
 import fnmatch
+import functools
+import subprocess
 from enum import Enum
 import os
 from os import listdir, makedirs
@@ -11,9 +13,15 @@ from datetime import date
 
 import jsonschema
 import yaml
-from jinja2 import Environment, PackageLoader
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader
 from yaml import MarkedYAMLError
 
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    # PyYAML is built without the libyaml bindings
+    from yaml import SafeLoader as YamlLoader
+
 from binary import FixSizedEntryListTypes, FixSizedTypes, FixSizedListTypes, FixSizedMapTypes
 from cpp import (
     cpp_ignore_service_list, 
@@ -51,12 +59,22 @@ from ts import (
     ts_types_encode,
 )
 
-MAJOR_VERSION_MULTIPLIER = 10000
-MINOR_VERSION_MULTIPLIER = 100
+# Versions are packed into an int as major << 16 | minor << 8 | patch,
+# so the minor and patch versions must fit in a byte.
+MAJOR_VERSION_MULTIPLIER = 1 << 16
+MINOR_VERSION_MULTIPLIER = 1 << 8
 PATCH_VERSION_MULTIPLIER = 1
 
 ID_VALIDATOR_IGNORE_SET = {"Jet", "Experimental"}
 
+_fix_sized_types = frozenset(FixSizedTypes)
+_fix_sized_list_types = frozenset(FixSizedListTypes)
+_fix_sized_map_types = frozenset(FixSizedMapTypes)
+_fix_sized_entry_list_types = frozenset(FixSizedEntryListTypes)
+
+_upper_snake_case_pattern = re.compile("((?<=[a-z0-9])[A-Z]|(?!^)[A-Z](?=[a-z]))")
+_trailing_whitespace_pattern = re.compile("[ \t]+$", re.M)
+
 
 def java_name(type_name):
     return "".join([capital(part) for part in type_name.split("_")])
@@ -79,7 +97,7 @@ def param_name(type_name):
 
 
 def is_fixed_type(param):
-    return param["type"] in FixSizedTypes
+    return param["type"] in _fix_sized_types
 
 
 def capital(txt):
@@ -87,30 +105,49 @@ def capital(txt):
 
 
 def to_upper_snake_case(camel_case_str):
-    return re.sub("((?<=[a-z0-9])[A-Z]|(?!^)[A-Z](?=[a-z]))", r"_\1", camel_case_str).upper()
+    return _upper_snake_case_pattern.sub(r"_\1", camel_case_str).upper()
     # s1 = re.sub('(.)([A-Z]+[a-z]+)', r'\1_\2', camel_case_str)
     # return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).upper()
 
 
 def version_to_number(major, minor, patch=0):
-    return (
-        MAJOR_VERSION_MULTIPLIER * major
-        + MINOR_VERSION_MULTIPLIER * minor
-        + PATCH_VERSION_MULTIPLIER * patch
-    )
+    return (major << 16) | (minor << 8) | patch
 
 
 def get_version_as_number(version):
     if not isinstance(version, str):
         version = str(version)
+    return _get_version_string_as_number(version)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_version_string_as_number(version):
     return version_to_number(*map(int, version.split(".")))
 
 
+class ParamList(list):
+    """
+    List of parameters of a definition that also holds its fixed and
+    variable sized parameters, so that the templates do not filter
+    the same parameters on every render.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.fixed_params = [p for p in self if is_fixed_type(p)]
+        self.var_size_params = [p for p in self if not is_fixed_type(p)]
+        self.new_params_by_since = {}
+
+
 def fixed_params(params):
+    if isinstance(params, ParamList):
+        return params.fixed_params
     return [p for p in params if is_fixed_type(p)]
 
 
 def var_size_params(params):
+    if isinstance(params, ParamList):
+        return params.var_size_params
     return [p for p in params if not is_fixed_type(p)]
 
 
@@ -121,7 +158,14 @@ def new_params(since, params):
     latter, a simple equality check between the versions that the method and
     the parameter is added is enough.
     """
-    return [p for p in params if p["since"] != since]
+    since_as_number = get_version_as_number(since)
+    if isinstance(params, ParamList):
+        result = params.new_params_by_since.get(since_as_number)
+        if result is None:
+            result = [p for p in params if p["_since_num"] != since_as_number]
+            params.new_params_by_since[since_as_number] = result
+        return result
+    return [p for p in params if p["_since_num"] != since_as_number]
 
 
 def filter_new_params(params, version):
@@ -131,18 +175,17 @@ def filter_new_params(params, version):
     before or at the same time with the given version.
     """
     version_as_number = get_version_as_number(version)
-    return [p for p in params if version_as_number >= get_version_as_number(p["since"])]
+    return [p for p in params if version_as_number >= p["_since_num"]]
 
 
 def generate_data_containing_requests_lookup_table(services, custom_services):
     table = collections.defaultdict(dict)
 
-    types_containing_serialized_data = {
-        "Data",
+    # Maps type names to whether they contain serialized data or not
+    contains_serialized_data = {
+        "Data": True,
     }
 
-    types_not_containing_serialized_data = set()
-
     if not custom_services:
         custom_types = {}
     else:
@@ -152,27 +195,25 @@ def generate_data_containing_requests_lookup_table(services, custom_services):
         }
 
     def type_contains_serialized_data(type_name):
-        if type_name in types_containing_serialized_data:
-            return True
-        elif type_name in types_not_containing_serialized_data:
-            return False
-        elif type_name.startswith("List_") or type_name.startswith("ListCN_") or type_name.startswith("Set_"):
-            item_type_name = type_name.split("_", 1)[1]
-            if type_contains_serialized_data(item_type_name):
-                types_containing_serialized_data.add(type_name)
-                return True
-        elif type_name.startswith("Map_") or type_name.startswith("EntryList_"):
-            key_type_name, value_type_name = type_name.split("_", 2)[1:3]
-            if type_contains_serialized_data(key_type_name) or type_contains_serialized_data(value_type_name):
-                types_containing_serialized_data.add(type_name)
-                return True
+        result = contains_serialized_data.get(type_name)
+        if result is not None:
+            return result
+
+        prefix, _, rest = type_name.partition("_")
+        if prefix in ("List", "ListCN", "Set"):
+            result = type_contains_serialized_data(rest)
+        elif prefix in ("Map", "EntryList"):
+            key_type_name, _, value_type_name = rest.partition("_")
+            result = type_contains_serialized_data(key_type_name) or type_contains_serialized_data(
+                value_type_name
+            )
         elif type_name in custom_types:
-            if custom_type_contains_serialized_data(type_name):
-                types_containing_serialized_data.add(type_name)
-                return True
+            result = custom_type_contains_serialized_data(type_name)
+        else:
+            result = False
 
-        types_not_containing_serialized_data.add(type_name)
-        return False
+        contains_serialized_data[type_name] = result
+        return result
 
     def custom_type_contains_serialized_data(custom_type_name):
         custom_type = custom_types[custom_type_name]
@@ -183,17 +224,22 @@ def generate_data_containing_requests_lookup_table(services, custom_services):
 
         return False
 
+    # Many requests share the same parameter types, so resolve
+    # each distinct type once before filling the table.
+    request_param_types = {
+        param["type"]
+        for service in services
+        for method in service["methods"]
+        for param in method["request"].get("params") or ()
+    }
+    for type_name in request_param_types:
+        type_contains_serialized_data(type_name)
+
     for service in services:
-        service_name = service["name"]
-        service_table = table[service_name]
+        service_table = table[service["name"]]
         for method in service["methods"]:
-            method_name = method["name"]
-            for param in method["request"].get("params", []):
-                if type_contains_serialized_data(param["type"]):
-                    service_table[method_name] = True
-                    break
-            else:
-                service_table[method_name] = False
+            params = method["request"].get("params") or ()
+            service_table[method["name"]] = any(contains_serialized_data[p["type"]] for p in params)
 
     return table
 
@@ -205,12 +251,12 @@ def generate_codecs(services, custom_services, template, output_dir, lang, env):
 
     id_fmt = "0x%02x%02x%02x"
     if lang is SupportedLanguages.CPP:
-        curr_dir = dirname(realpath(__file__))
-        cpp_dir = "%s/cpp" % curr_dir
-        f = open(join(cpp_dir, "header_includes.txt"), "r")
-        save_file(join(output_dir, "codecs.h"), f.read(), "w")
-        f = open(join(cpp_dir, "source_header.txt"), "r")
-        save_file(join(output_dir, "codecs.cpp"), f.read(), "w")
+        # Contents of codecs.h and codecs.cpp are accumulated
+        # and written once after all the methods are rendered.
+        cpp_header_contents = [_read_cpp_fragment("header_includes.txt")]
+        cpp_source_contents = [_read_cpp_fragment("source_header.txt")]
+        cpp_header_template = env.get_template("codec-template.h.j2")
+        cpp_source_template = env.get_template("codec-template.cpp.j2")
 
     for service in services:
         if ignore_service(service, lang):
@@ -221,6 +267,10 @@ def generate_codecs(services, custom_services, template, output_dir, lang, env):
                 raise NotImplementedError("Methods not found for service " + service)
 
         service_name = service["name"]
+        service_data_containing_requests = data_containing_requests[service_name]
+        # Shared by all the methods of the service, only the
+        # method specific entries are updated before rendering.
+        context = {"service_name": service_name}
         for method in service["methods"]:
             if ignore_method(service, method, lang):
                 continue
@@ -236,39 +286,30 @@ def generate_codecs(services, custom_services, template, output_dir, lang, env):
 
             method_name = method["name"]
             codec_file_name = file_name_generators[lang](service_name, method_name)
-            contains_serialized_data_in_request = data_containing_requests[service_name][method_name]
+            context["method"] = method
+            context["contains_serialized_data_in_request"] = service_data_containing_requests[method_name]
             try:
                 if lang is SupportedLanguages.CPP:
-                    codec_template = env.get_template("codec-template.h.j2")
-                    content = codec_template.render(
-                        service_name=service_name,
-                        method=method,
-                        contains_serialized_data_in_request=contains_serialized_data_in_request
-                    )
-                    save_file(join(output_dir, "codecs.h"), content, "a+")
-
-                    codec_template = env.get_template("codec-template.cpp.j2")
-                    content = codec_template.render(
-                        service_name=service_name,
-                        method=method,
-                        contains_serialized_data_in_request=contains_serialized_data_in_request
-                    )
-                    save_file(join(output_dir, "codecs.cpp"), content, "a+")
+                    cpp_header_contents.append(cpp_header_template.render(context))
+                    cpp_source_contents.append(cpp_source_template.render(context))
                 else:
-                    content = template.render(
-                        service_name=service_name,
-                        method=method,
-                        contains_serialized_data_in_request=contains_serialized_data_in_request
-                    )
-                    save_file(join(output_dir, codec_file_name), content)
+                    save_template(join(output_dir, codec_file_name), template, context)
             except NotImplementedError as e:
                 print("[%s] contains missing type mapping so ignoring it. Error: %s" % (codec_file_name, e))
 
     if lang is SupportedLanguages.CPP:
-        f = open(join(cpp_dir, "footer.txt"), "r")
-        content = f.read()
-        save_file(join(output_dir, "codecs.h"), content, "a+")
-        save_file(join(output_dir, "codecs.cpp"), content, "a+")
+        content = _read_cpp_fragment("footer.txt")
+        cpp_header_contents.append(content)
+        cpp_source_contents.append(content)
+        save_file(join(output_dir, "codecs.h"), "".join(cpp_header_contents))
+        save_file(join(output_dir, "codecs.cpp"), "".join(cpp_source_contents))
+
+
+@functools.lru_cache(maxsize=None)
+def _read_cpp_fragment(file_name):
+    cpp_dir = join(dirname(realpath(__file__)), "cpp")
+    with open(join(cpp_dir, file_name), "r") as f:
+        return f.read()
 
 
 def generate_custom_codecs(services, template, output_dir, lang, env):
@@ -299,8 +340,7 @@ def generate_custom_codecs(services, template, output_dir, lang, env):
                             if codec["name"] == "HazelcastJsonValue":
                                 codec["params"][0]["getterMethod"] = "toString()"
                         codec_file_name = file_name_generators[lang](codec["name"])
-                        content = template.render(codec=codec)
-                        save_file(join(output_dir, codec_file_name), content)
+                        save_template(join(output_dir, codec_file_name), template, {"codec": codec})
                 except NotImplementedError:
                     print("[%s] contains missing type mapping so ignoring it." % codec_file_name)
 
@@ -316,33 +356,75 @@ def generate_documentation(services, custom_definitions, template, output_dir):
         file.writelines(content)
 
 
+_ParsedType = collections.namedtuple(
+    "_ParsedType",
+    [
+        "item_type",
+        "key_type",
+        "value_type",
+        "is_var_sized_list",
+        "is_var_sized_list_contains_nullable",
+        "is_var_sized_map",
+        "is_var_sized_entry_list",
+    ],
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_type(param_type):
+    # The templates query the same few type names over and
+    # over again, so each of them is parsed only once.
+    prefix, separator, item = param_type.partition("_")
+    if not separator:
+        prefix = None
+    parts = param_type.split("_", 2)
+    return _ParsedType(
+        item_type=item if prefix in ("List", "ListCN") else None,
+        key_type=parts[1] if len(parts) > 1 else None,
+        value_type=parts[2] if len(parts) > 2 else None,
+        is_var_sized_list=(
+            prefix == "List" and param_type not in _fix_sized_list_types
+        ),
+        is_var_sized_list_contains_nullable=(
+            prefix == "ListCN" and param_type not in _fix_sized_list_types
+        ),
+        is_var_sized_map=(
+            prefix == "Map" and param_type not in _fix_sized_map_types
+        ),
+        is_var_sized_entry_list=(
+            prefix == "EntryList" and param_type not in _fix_sized_entry_list_types
+        ),
+    )
+
+
 def item_type(lang_name, param_type):
-    if param_type.startswith("List_") or param_type.startswith("ListCN_"):
-        return lang_name(param_type.split("_", 1)[1])
+    item_type_name = _parse_type(param_type).item_type
+    if item_type_name is not None:
+        return lang_name(item_type_name)
 
 
 def key_type(lang_name, param_type):
-    return lang_name(param_type.split("_", 2)[1])
+    return lang_name(_parse_type(param_type).key_type)
 
 
 def value_type(lang_name, param_type):
-    return lang_name(param_type.split("_", 2)[2])
+    return lang_name(_parse_type(param_type).value_type)
 
 
 def is_var_sized_list(param_type):
-    return param_type.startswith("List_") and param_type not in FixSizedListTypes
+    return _parse_type(param_type).is_var_sized_list
 
 
 def is_var_sized_list_contains_nullable(param_type):
-    return param_type.startswith("ListCN_") and param_type not in FixSizedListTypes
+    return _parse_type(param_type).is_var_sized_list_contains_nullable
 
 
 def is_var_sized_map(param_type):
-    return param_type.startswith("Map_") and param_type not in FixSizedMapTypes
+    return _parse_type(param_type).is_var_sized_map
 
 
 def is_var_sized_entry_list(param_type):
-    return param_type.startswith("EntryList_") and param_type not in FixSizedEntryListTypes
+    return _parse_type(param_type).is_var_sized_entry_list
 
 
 def load_services(protocol_def_dir):
@@ -353,7 +435,7 @@ def load_services(protocol_def_dir):
         if isfile(file_path):
             with open(file_path, "r") as file:
                 try:
-                    data = yaml.load(file, Loader=yaml.Loader)
+                    data = yaml.load(file, Loader=YamlLoader)
                 except MarkedYAMLError as err:
                     print(err)
                     exit(-1)
@@ -361,59 +443,92 @@ def load_services(protocol_def_dir):
     return services
 
 
+def preprocess_definitions(definitions):
+    """
+    Precomputes the values that are frequently used while rendering
+    the templates and stores them in the definitions. Since the schemas
+    do not allow unknown properties, this should be called after the
+    definitions are validated.
+    """
+    for definition in definitions:
+        for method in definition.get("methods", []):
+            _preprocess_definition(method)
+            _preprocess_params(method["request"])
+            _preprocess_params(method["response"])
+            for event in method.get("events", []):
+                _preprocess_definition(event)
+                _preprocess_params(event)
+
+        for custom_type in definition.get("customTypes", []):
+            _preprocess_definition(custom_type)
+            _preprocess_params(custom_type)
+
+
+def _preprocess_definition(definition):
+    definition["_since_num"] = get_version_as_number(definition["since"])
+
+
+def _preprocess_params(definition):
+    params = definition.get("params")
+    if params is None:
+        return
+    for param in params:
+        _preprocess_definition(param)
+    definition["params"] = ParamList(params)
+
+
 def validate_services(services, schema_path, no_id_check, protocol_versions):
     valid = True
-    with open(schema_path, "r") as schema_file:
-        schema = json.load(schema_file)
-        for i in range(len(services)):
-            service = services[i]
-            if not validate_against_schema(service, schema):
-                return False
-
-            if not no_id_check and service["name"] not in ID_VALIDATOR_IGNORE_SET:
-                service_id = service["id"]
-                # Validate id ordering of services.
-                if i != service_id:
+    validator = get_schema_validator(schema_path)
+    for i in range(len(services)):
+        service = services[i]
+        if not validate_against_schema(service, validator):
+            return False
+
+        if not no_id_check and service["name"] not in ID_VALIDATOR_IGNORE_SET:
+            service_id = service["id"]
+            # Validate id ordering of services.
+            if i != service_id:
+                print(
+                    "Check the service id of the %s. Expected: %s, found: %s."
+                    % (service["name"], i, service_id)
+                )
+                valid = False
+            # Validate id ordering of definition methods.
+            methods = service["methods"]
+            for j in range(len(methods)):
+                method = methods[j]
+                method_id = method["id"]
+                if (j + 1) != method_id:
                     print(
-                        "Check the service id of the %s. Expected: %s, found: %s."
-                        % (service["name"], i, service_id)
+                        "Check the method id of %s#%s. Expected: %s, found: %s"
+                        % (service["name"], method["name"], (j + 1), method_id)
                     )
                     valid = False
-                # Validate id ordering of definition methods.
-                methods = service["methods"]
-                for j in range(len(methods)):
-                    method = methods[j]
-                    method_id = method["id"]
-                    if (j + 1) != method_id:
-                        print(
-                            "Check the method id of %s#%s. Expected: %s, found: %s"
-                            % (service["name"], method["name"], (j + 1), method_id)
-                        )
-                        valid = False
-                    request_params = method["request"].get("params", [])
-                    method_name = service["name"] + "#" + method["name"]
-                    if not is_parameters_ordered_and_semantically_correct(
-                        method["since"], method_name + "#request", request_params, protocol_versions
-                    ):
-                        valid = False
-                    response_params = method["response"].get("params", [])
+                request_params = method["request"].get("params", [])
+                method_name = service["name"] + "#" + method["name"]
+                if not is_parameters_ordered_and_semantically_correct(
+                    method["since"], method_name + "#request", request_params, protocol_versions
+                ):
+                    valid = False
+                response_params = method["response"].get("params", [])
+                if not is_parameters_ordered_and_semantically_correct(
+                    method["since"],
+                    method_name + "#response",
+                    response_params,
+                    protocol_versions,
+                ):
+                    valid = False
+                events = method.get("events", [])
+                for event in events:
+                    event_params = event.get("params", [])
                     if not is_parameters_ordered_and_semantically_correct(
-                        method["since"],
-                        method_name + "#response",
-                        response_params,
+                        event["since"],
+                        method_name + "#" + event["name"] + "#event",
+                        event_params,
                         protocol_versions,
                     ):
                         valid = False
-                    events = method.get("events", [])
-                    for event in events:
-                        event_params = event.get("params", [])
-                        if not is_parameters_ordered_and_semantically_correct(
-                            event["since"],
-                            method_name + "#" + event["name"] + "#event",
-                            event_params,
-                            protocol_versions,
-                        ):
-                            valid = False
     return valid
 
 
@@ -435,8 +550,7 @@ def is_semantically_correct_param(version, protocol_versions):
 
 
 def is_parameters_ordered_and_semantically_correct(since, name, params, protocol_versions):
-    is_ordered = True
-    is_semantically_correct = True
+    is_valid = True
     version = get_version_as_number(since)
 
     if not is_semantically_correct_param(version, protocol_versions):
@@ -446,7 +560,7 @@ def is_parameters_ordered_and_semantically_correct(since, name, params, protocol
             'It is set to version "%s" but this protocol version does '
             "not semantically follow other protocol versions!" % (method_or_event_name, since)
         )
-        is_semantically_correct = False
+        is_valid = False
 
     for param in params:
         param_version = get_version_as_number(param["since"])
@@ -457,7 +571,7 @@ def is_parameters_ordered_and_semantically_correct(since, name, params, protocol
                 "not semantically follow other protocol versions!"
                 % (param["name"], name, param["since"])
             )
-            is_semantically_correct = False
+            is_valid = False
 
         if version > param_version:
             print(
@@ -465,18 +579,17 @@ def is_parameters_ordered_and_semantically_correct(since, name, params, protocol
                 "Parameters should be in the increasing order of since values!"
                 % (param["name"], name)
             )
-            is_ordered = False
+            is_valid = False
 
         version = param_version
-    return is_ordered and is_semantically_correct
+    return is_valid
 
 
 def validate_custom_protocol_definitions(definition, schema_path, protocol_versions):
     valid = True
-    with open(schema_path, "r") as schema_file:
-        schema = json.load(schema_file)
+    validator = get_schema_validator(schema_path)
     custom_types = definition[0]
-    if not validate_against_schema(custom_types, schema):
+    if not validate_against_schema(custom_types, validator):
         return False
     for custom_type in custom_types["customTypes"]:
         params = custom_type.get("params", [])
@@ -487,11 +600,20 @@ def validate_custom_protocol_definitions(definition, schema_path, protocol_versi
     return valid
 
 
-def validate_against_schema(service, schema):
-    try:
-        jsonschema.validate(service, schema)
-    except jsonschema.ValidationError as e:
-        print("Validation error on %s: %s" % (service.get("name", None), e))
+@functools.lru_cache(maxsize=None)
+def get_schema_validator(schema_path):
+    with open(schema_path, "r") as schema_file:
+        schema = json.load(schema_file)
+    validator_cls = jsonschema.validators.validator_for(schema)
+    validator_cls.check_schema(schema)
+    return validator_cls(schema)
+
+
+def validate_against_schema(service, validator):
+    # Reports the same error that jsonschema.validate would raise
+    error = jsonschema.exceptions.best_match(validator.iter_errors(service))
+    if error is not None:
+        print("Validation error on %s: %s" % (service.get("name", None), error))
         return False
     return True
 
@@ -499,17 +621,48 @@ def validate_against_schema(service, schema):
 def save_file(file, content, mode="w"):
 
     if file.endswith(".cs"):
-        content = content.replace("\r\n", "\n") # crlf -> lf
-        content = content.replace("\r", "\n")   # cr -> lf
-        content = re.sub("[ \t]+$", "", content, 0, re.M)
-        content = content.rstrip("\n")          # trim all trailing lf
-        content = content  + "\n"             # append one single trailing lf
+        # crlf -> lf, cr -> lf, trim trailing whitespace of the lines
+        # and end the content with one single trailing lf
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+        content = _trailing_whitespace_pattern.sub("", content).rstrip("\n") + "\n"
+
+    # The encoded content is both hashed and written, so that it
+    # is encoded only once. Newlines are translated as in text mode.
+    encoded_content = content.encode("utf-8")
+    codec_hash = hashlib.md5(encoded_content).hexdigest()
+    encoded_content = encoded_content.replace(b"!codec_hash!", codec_hash.encode("ascii"))
+    if os.linesep != "\n":
+        encoded_content = encoded_content.replace(b"\n", os.linesep.encode("ascii"))
+    with open(file, mode + "b") as f:
+        f.write(encoded_content)
+
+
+def save_template(file, template, context):
+    """
+    Renders the template with the given context into the file.
+    The output is streamed to the file, unless it has to be
+    post-processed as a whole by the save_file. The file is
+    left untouched if the rendering fails.
+    """
+    if file.endswith(".cs") or _contains_codec_hash(template):
+        save_file(file, template.render(context))
+        return
+
+    tmp_file = file + ".tmp"
+    try:
+        with open(tmp_file, "w", encoding="utf-8", newline=os.linesep) as f:
+            template.stream(context).dump(f)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    os.replace(tmp_file, file)
 
-    m = hashlib.md5()
-    m.update(content.encode("utf-8"))
-    codec_hash = m.hexdigest()
-    with open(file, mode, newline=os.linesep) as file:
-        file.writelines(content.replace("!codec_hash!", codec_hash))
+
+@functools.lru_cache(maxsize=None)
+def _contains_codec_hash(template):
+    env = template.environment
+    source, _, _ = env.loader.get_source(env, template.name)
+    return "!codec_hash!" in source
 
 
 def get_protocol_versions(protocol_defs, custom_codec_defs):
@@ -646,6 +799,20 @@ language_service_ignore_list = {
 }
 
 
+def _compile_ignore_patterns(patterns):
+    # Combines all glob patterns of a language into a single
+    # regex, so that names are matched against it only once.
+    if not patterns:
+        return None
+    return re.compile("|".join("(?:%s)" % fnmatch.translate(pattern) for pattern in patterns))
+
+
+language_service_ignore_patterns = {
+    lang: _compile_ignore_patterns(patterns)
+    for lang, patterns in language_service_ignore_list.items()
+}
+
+
 def ignore_service(service, lang):
     name = service["name"]
     return ignore_service_or_method(name, lang)
@@ -657,18 +824,34 @@ def ignore_method(service, method, lang):
 
 
 def ignore_service_or_method(name, lang):
-    patterns = language_service_ignore_list[lang]
-    for pattern in patterns:
-        if fnmatch.fnmatch(name, pattern):
-            print("[%s] is in ignore list so ignoring it." % name)
-            return True
+    pattern = language_service_ignore_patterns[lang]
+    if pattern is not None and pattern.match(name):
+        print("[%s] is in ignore list so ignoring it." % name)
+        return True
     return False
 
 
+@functools.lru_cache(maxsize=1)
+def _get_protocol_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=2
+        )
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
 def create_environment(lang, namespace):
+    # Templates do not change during a generator run, so there is no need
+    # to check them for updates. Compiled templates are cached on disk to
+    # skip parsing and compiling them on subsequent runs. The default
+    # cache directory of Jinja is private to the current user.
     env = Environment(
         loader=PackageLoader(lang.value, "."),
         extensions=["jinja2.ext.do", "jinja2.ext.loopcontrols"],
+        auto_reload=False,
+        bytecode_cache=FileSystemBytecodeCache(),
     )
     env.trim_blocks = True
     env.lstrip_blocks = True
@@ -690,12 +873,7 @@ def create_environment(lang, namespace):
     env.globals["get_size"] = get_size
     env.globals["is_trivial"] = is_trivial
     env.globals["copyright_year"] = date.today().year
-    
-    try:
-        with os.popen("git rev-parse --short HEAD") as f:
-            env.globals["protocol_commit"] = f.readlines()[0].strip()
-    except:
-        env.globals["protocol_commit"] = "unknown"
+    env.globals["protocol_commit"] = _get_protocol_commit()
 
     for fn_name, fn in language_specific_funcs[lang].items():
         env.globals[fn_name] = fn